@@ -1,9 +1,21 @@
 #!/usr/bin/env python3
+import asyncio
+import functools
+import hashlib
 import os
+import re
 import subprocess
-from openai import OpenAI  # New API interface
-import whisper
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import ctranslate2
+import numpy as np
+import orjson
+import tiktoken
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError  # New API interface
+from faster_whisper import WhisperModel, decode_audio
+from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps
 from dotenv import load_dotenv
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 import time
 
 # ANSI escape sequences for colored output
@@ -14,19 +26,92 @@ YELLOW = "\033[93m"
 RED = "\033[91m"
 BOLD = "\033[1m"
 RESET = "\033[0m"
+if not sys.stdout.isatty():
+    # No escape codes when output is piped or captured in logs
+    BLUE = CYAN = GREEN = YELLOW = RED = BOLD = RESET = ""
+
+# Transcribed segments are grouped into 30-second windows; finished windows are
+# summarized in batches while the remaining audio is still being transcribed.
+CHUNK_SECONDS = 30
+WINDOWS_PER_SUMMARY_CHUNK = 10
+MAX_CONCURRENT_REQUESTS = 8
+# Requests to the OpenAI API are throttled to this many in flight and retried on rate limits (429),
+# server errors (5xx) and connection errors, waiting as long as the API's Retry-After header asks
+# or backing off exponentially.
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+# Prompts start with the same bytes (developer message, then the transcription) and put the
+# call-specific instructions last, so OpenAI's automatic prefix caching can reuse the prefix.
+DEVELOPER_MESSAGE = "You are a helpful assistant."
+MODEL = "gpt-4o"
+# Prompts shorter than this are routed to the cheaper, faster model.
+SMALL_MODEL = "gpt-4o-mini"
+SMALL_MODEL_MAX_TOKENS = 4000
+# When a summary (or the section summaries) is sent too, flashcard prompts are kept under this many tokens by
+# sending excerpts of long transcriptions instead of the whole text. The full workflow only summarizes
+# chunks (map-reduce) for transcriptions that do not fit in it whole.
+FLASHCARDS_TOKEN_BUDGET = 20000
+# Unpunctuated transcriptions are excerpted in runs of this many words.
+DOWNSAMPLE_WORDS_PER_PIECE = 50
+# Proactive client-side limits, configurable via the environment (see RateLimiter)
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 60000
+# Responses are cached on disk by a hash of the full request; bump this to invalidate the cache.
+PROMPT_TEMPLATE_VERSION = "1"
+# Whisper's native input format: 16 kHz mono
+SAMPLE_RATE = 16000
+WHISPER_MODEL = "base"  # Change the model if needed.
+# Silero VAD runs before decoding and drops every pause longer than this, so the
+# encoder only sees speech (faster-whisper's default only drops pauses over 2 s).
+VAD_PARAMETERS = {"min_silence_duration_ms": 500}
+# On CPU, recordings longer than this are split into parts that are transcribed in parallel
+# by a separate model instance whose workers each get an equal share of the CPU threads.
+PARALLEL_MIN_SECONDS = 600
+PART_SECONDS = 300
+TRANSCRIPTION_WORKERS = min(4, os.cpu_count() or 1)
 
 def print_header():
-    header = f"""
-{BOLD}{CYAN}===================================================================
-          ETEPS Reading Club Learning Assists Production Tool
-==================================================================={RESET}
+    lines = [
+        "",
+        f"{BOLD}{CYAN}===================================================================",
+        "          ETEPS Reading Club Learning Assists Production Tool",
+        f"==================================================================={RESET}",
+        ""
+    ]
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def write_file(path, data):
+    """
+    Writes the bytes to the given path, handing them to os.write directly
+    instead of going through a buffered file object.
+    """
+    data = memoryview(data)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+def write_text_file(path, text):
+    """
+    Writes the text to the given path as UTF-8, encoding it once.
+    """
+    write_file(path, text.encode("utf-8"))
+
+def replace_file(path, data):
     """
-    print(header)
+    Writes the bytes to a temporary file next to path and moves it into place,
+    so path never holds a half-written file.
+    """
+    temporary_file = f"{path}.{os.getpid()}.tmp"
+    write_file(temporary_file, data)
+    os.replace(temporary_file, path)
 
-def choose_video_file():
+def choose_video_file(multiple=False):
     """
     Prompts the user to enter a directory, then lists available video files.
-    Returns the full path of the selected file or None.
+    Returns the full path of the selected file or None. With multiple=True, several files
+    can be selected (comma-separated numbers or "all") and a list of paths is returned instead.
     """
     directory = input(f"{BOLD}Enter the directory containing your video files (press Enter for current directory): {RESET}").strip()
     if not directory:
@@ -35,9 +120,13 @@ def choose_video_file():
         print(f"{RED}Directory does not exist.{RESET}")
         return None
 
-    video_extensions = ('.mp4', '.mov', '.avi')
+    video_extensions = {'.mp4', '.mov', '.avi'}
     try:
-        video_files = [f for f in os.listdir(directory) if f.lower().endswith(video_extensions)]
+        with os.scandir(directory) as entries:
+            video_files = [
+                entry.name for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in video_extensions
+            ]
     except PermissionError as e:
         print(f"{RED}Permission error: Cannot access {directory}. Please check your system permissions.{RESET}")
         return None
@@ -50,7 +139,20 @@ def choose_video_file():
     for idx, file in enumerate(video_files, 1):
         print(f"  {GREEN}{idx}.{RESET} {file}")
 
-    choice = input(f"\nSelect a video file by number or type the file name: ").strip()
+    if multiple:
+        choice = input(f"\nSelect video files by number (comma-separated, or 'all') or type a file name: ").strip()
+        if choice.lower() == "all":
+            return [os.path.join(directory, f) for f in video_files]
+        numbers = [part.strip() for part in choice.split(",")]
+        if all(number.isdigit() for number in numbers):
+            indices = list(dict.fromkeys(int(number) for number in numbers))  # Drop repeated numbers
+            if all(1 <= index <= len(video_files) for index in indices):
+                return [os.path.join(directory, video_files[index - 1]) for index in indices]
+            print(f"{RED}Invalid selection number.{RESET}")
+            return None
+    else:
+        choice = input(f"\nSelect a video file by number or type the file name: ").strip()
+
     if choice.isdigit():
         index = int(choice)
         if 1 <= index <= len(video_files):
@@ -61,100 +163,759 @@ def choose_video_file():
     else:
         candidate = os.path.join(directory, choice)
         if os.path.exists(candidate):
-            return candidate
+            return [candidate] if multiple else candidate
         else:
             print(f"{RED}File not found.{RESET}")
             return None
 
-def extract_audio(video_file, audio_file):
+async def run_ffmpeg(command, capture_output=False):
+    """
+    Runs an ffmpeg (or ffprobe) command without blocking the event loop and returns its stdout (if captured).
+    ffmpeg's log (stderr) always goes to the terminal, so its error messages stay visible.
+    Raises CalledProcessError if ffmpeg fails, like subprocess.run(check=True).
+    """
+    stdout = asyncio.subprocess.PIPE if capture_output else None
+    process = await asyncio.create_subprocess_exec(*command, stdout=stdout)
+    output, _ = await process.communicate()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return output
+
+async def extract_audio(video_file, audio_file=None):
     """
     Extracts audio from the given video file using ffmpeg and saves it as a WAV file.
+    Without an audio_file, ffmpeg streams the audio in Whisper's input format (16 kHz mono
+    float32) through a pipe instead, and it is returned as a NumPy array without touching disk.
     """
+    if audio_file:
+        await extract_audio_batch([video_file], [audio_file])
+        return audio_file
     command = [
         "ffmpeg",
-        "-y",  # Overwrite output file if it exists
+        "-threads", "0",  # Let ffmpeg pick the number of threads
         "-i", video_file,
         "-vn",  # No video
-        "-acodec", "pcm_s16le",
-        "-ar", "44100",  # Sampling rate
-        "-ac", "2",  # Stereo
-        audio_file
+        "-f", "f32le",  # Raw float32 PCM to stdout
+        "-ar", str(SAMPLE_RATE),
+        "-ac", "1",  # Mono
+        "-"
+    ]
+    audio = np.frombuffer(await run_ffmpeg(command, capture_output=True), np.float32)
+    print(f"{GREEN}Audio extracted from {video_file}{RESET}")
+    return audio
+
+async def extract_audio_batch(video_files, audio_files):
+    """
+    Extracts audio from several video files with a single ffmpeg invocation,
+    mapping the audio stream of each input to its own WAV output.
+    """
+    command = [
+        "ffmpeg",
+        "-y",  # Overwrite output files if they exist
+    ]
+    for video_file in video_files:
+        command += ["-threads", "0", "-i", video_file]
+    for index, audio_file in enumerate(audio_files):
+        command += [
+            "-map", f"{index}:a:0",  # Audio of the matching input only
+            "-acodec", "pcm_s16le",
+            "-ar", "44100",  # Sampling rate
+            "-ac", "2",  # Stereo
+            audio_file
+        ]
+    await run_ffmpeg(command)
+    for audio_file in audio_files:
+        print(f"{GREEN}Audio extracted to {audio_file}{RESET}")
+
+def batch_audio_files(video_files, output_folder):
+    """
+    Returns a WAV path in output_folder for each video file, named after the video.
+    Videos that share a name (e.g. talk.mp4 and talk.mov) keep their extension in it,
+    with a counter added if that is still taken, so no two outputs overwrite each other.
+    """
+    audio_files = []
+    used = set()
+    for video_file in video_files:
+        stem, extension = os.path.splitext(os.path.basename(video_file))
+        name = stem
+        if name.lower() in used:
+            name = f"{stem}_{extension[1:]}"
+        counter = 2
+        while name.lower() in used:  # Compared case-insensitively for macOS and Windows
+            name = f"{stem}_{extension[1:]}_{counter}"
+            counter += 1
+        used.add(name.lower())
+        audio_files.append(os.path.join(output_folder, name + ".wav"))
+    return audio_files
+
+async def probe_duration(video_file):
+    """
+    Returns the duration of the video in seconds, read from its container with ffprobe.
+    """
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        video_file
     ]
-    subprocess.run(command, check=True)
-    print(f"{GREEN}Audio extracted to {audio_file}{RESET}")
+    return float(await run_ffmpeg(command, capture_output=True))
+
+async def load_model_for(video_file):
+    """
+    Loads the Whisper model that transcribing the video will use, which depends on its length.
+    """
+    try:
+        workers = transcription_workers(await probe_duration(video_file))
+    except (subprocess.CalledProcessError, ValueError):
+        workers = 1  # Unknown length (e.g. a live stream); decode_segments decides once the audio is in
+    await asyncio.to_thread(get_whisper_model, WHISPER_MODEL, workers)
+
+async def extract_audio_and_load_model(video_file):
+    """
+    Extracts the audio of the video for transcription while the Whisper model
+    loads in a background thread, and returns the audio.
+    """
+    audio, _ = await asyncio.gather(extract_audio(video_file), load_model_for(video_file))
+    return audio
+
+@functools.lru_cache(maxsize=1)
+def get_device():
+    """
+    Returns the device and compute type for Whisper: float16 on a CUDA GPU, int8 on CPU.
+    """
+    if ctranslate2.get_cuda_device_count() > 0:
+        return "cuda", "float16"
+    return "cpu", "int8"
+
+@functools.lru_cache(maxsize=1)
+def get_whisper_model(name, workers=1):
+    """
+    Loads the Whisper model once per process, and reuses it for every later transcription
+    with the same worker count. A single-worker model keeps CTranslate2's default threading; with more
+    workers, each parallel transcription gets an equal share of the CPU threads.
+    """
+    device, compute_type = get_device()
+    options = {}
+    if workers > 1:
+        options = {"cpu_threads": max(1, (os.cpu_count() or 1) // workers), "num_workers": workers}
+    print(f"{BLUE}Loading Whisper model on {device} ({compute_type})...{RESET}")
+    return WhisperModel(name, device=device, compute_type=compute_type, **options)
+
+def transcription_workers(duration):
+    """
+    Returns how many parts of a recording duration seconds long are transcribed in parallel:
+    TRANSCRIPTION_WORKERS for recordings longer than PARALLEL_MIN_SECONDS on CPU, otherwise 1.
+    """
+    if duration > PARALLEL_MIN_SECONDS and TRANSCRIPTION_WORKERS > 1 and get_device()[0] == "cpu":
+        return TRANSCRIPTION_WORKERS
+    return 1
+
+def transcribe_part(model, audio, offset=0.0, language=None):
+    """
+    Transcribes audio that starts offset seconds into the recording, skipping silence with VAD.
+    The language is detected unless given.
+    Returns the transcription info and a lazy iterator of (end time, text) pairs.
+    """
+    segments, info = model.transcribe(
+        audio, beam_size=1, language=language, vad_filter=True, vad_parameters=VAD_PARAMETERS
+    )
+    return info, ((offset + segment.end, segment.text.strip()) for segment in segments)
+
+def find_split_points(total_samples, speech_chunks, part_samples):
+    """
+    Returns the sample offsets at which to split a recording into parts of about part_samples,
+    each in the middle of the pause between two VAD speech chunks that is closest to the target,
+    so that no word is cut in half. Returns fewer points when there are not enough pauses.
+    """
+    pauses = [(first["end"] + second["start"]) // 2 for first, second in zip(speech_chunks, speech_chunks[1:])]
+    points = []
+    for target in range(part_samples, total_samples, part_samples):
+        previous = points[-1] if points else 0
+        candidates = [pause for pause in pauses if pause > previous]
+        if not candidates:
+            break
+        point = min(candidates, key=lambda pause: abs(pause - target))
+        if point not in points:
+            points.append(point)
+    return points
+
+def leading_speech(audio, speech_chunks, samples):
+    """
+    Returns about the first samples of speech in the audio, joining the VAD speech chunks that
+    cover them, so that language detection can skip silence without running VAD again.
+    """
+    chunks = []
+    total = 0
+    for chunk in speech_chunks:
+        chunks.append(chunk)
+        total += chunk["end"] - chunk["start"]
+        if total >= samples:
+            break
+    audio_chunks, _ = collect_chunks(audio, chunks)
+    return np.concatenate(audio_chunks)[:samples]
+
+def decode_segments(audio, infos):
+    """
+    Yields (end time, text) pairs for the whole recording in order, appending the
+    transcription info of each part to infos. On CPU, recordings longer than PARALLEL_MIN_SECONDS
+    are split at pauses into parts of about PART_SECONDS that are transcribed in parallel,
+    all in the language detected for the whole recording. On a GPU, parallel
+    workers would only add model copies, so the recording is always transcribed in one pass.
+    """
+    workers = transcription_workers(len(audio) / SAMPLE_RATE)
+    model = get_whisper_model(WHISPER_MODEL, workers)
+    if workers == 1:
+        info, segments = transcribe_part(model, audio)
+        infos.append(info)
+        yield from segments
+        return
+    speech_chunks = get_speech_timestamps(audio, VadOptions(**VAD_PARAMETERS))
+    points = find_split_points(len(audio), speech_chunks, PART_SECONDS * SAMPLE_RATE)
+    bounds = list(zip([0] + points, points + [len(audio)]))
+    # Detect the language once so that every part is decoded the same way.
+    language = None
+    if speech_chunks:
+        language = model.detect_language(leading_speech(audio, speech_chunks, model.feature_extractor.n_samples))[0]
+
+    def transcribe_whole_part(bound):
+        start, end = bound
+        info, segments = transcribe_part(model, audio[start:end], start / SAMPLE_RATE, language)
+        return info, list(segments)
 
-def transcribe_audio(audio_file, transcription_file):
+    with ThreadPoolExecutor(max_workers=TRANSCRIPTION_WORKERS) as executor:
+        for info, segments in executor.map(transcribe_whole_part, bounds):
+            infos.append(info)
+            yield from segments
+
+def transcribe_audio(audio, transcription_file, on_chunk=None):
     """
-    Uses OpenAI's Whisper to transcribe the audio file.
-    Uses the built-in progress bar (with verbose=False) and stores the transcription.
+    Uses faster-whisper (CTranslate2) to transcribe the audio (a file path or a 16 kHz mono
+    float32 array), skipping silence with VAD.
+    Segments are grouped into 30-second windows and each window is passed to on_chunk (if given)
+    as soon as it is decoded. The full transcription is stored once every segment has been decoded.
     """
-    print(f"{BLUE}Loading Whisper model...{RESET}")
-    model = whisper.load_model("base")  # Change the model if needed.
+    if not isinstance(audio, np.ndarray):
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
     print(f"{BLUE}Transcribing audio...{RESET}")
-    result = model.transcribe(audio_file, verbose=False)
-    transcription = result["text"]
+    infos = []
+    texts = []
+    window = []
+    window_end = CHUNK_SECONDS
+
+    def flush():
+        text = " ".join(window)
+        window.clear()
+        texts.append(text)
+        if on_chunk:
+            on_chunk(text)
+
+    interactive = sys.stdout.isatty()
+    reported_tenths = 0
+    for end, text in decode_segments(audio, infos):
+        if interactive:
+            print(f"\r{BLUE}Transcribed {end:.0f}/{duration:.0f} seconds{RESET}", end="", flush=True)
+        elif duration and int(10 * end / duration) > reported_tenths:
+            # Piped output or logs get a line per tenth of the audio instead of one per segment
+            reported_tenths = int(10 * end / duration)
+            print(f"Transcribed {end:.0f}/{duration:.0f} seconds", flush=True)
+        if text:
+            window.append(text)
+        if end >= window_end and window:
+            flush()
+            window_end = (end // CHUNK_SECONDS + 1) * CHUNK_SECONDS
+    if window:
+        flush()
+    if interactive:
+        print()
+    if duration:
+        skipped = sum(info.duration - info.duration_after_vad for info in infos)
+        print(f"{BLUE}Skipped {skipped:.0f}s of silence ({skipped / duration:.0%} of the audio){RESET}")
+    transcription = " ".join(texts)
     print(f"{GREEN}Transcription complete.{RESET}")
-    with open(transcription_file, "w", encoding="utf-8") as f:
-        f.write(transcription)
+    write_text_file(transcription_file, transcription)
     print(f"{GREEN}Transcription saved to {transcription_file}{RESET}")
     return transcription
 
-def generate_summary(transcription):
+# The client, the semaphore and the rate limiter's lock belong to the event loop that first uses
+# them, and every menu action runs its own loop with asyncio.run(); they are created per loop.
+
+@functools.lru_cache(maxsize=1)
+def get_client(loop):
     """
-    Uses the new OpenAI API interface to generate a summary from the transcription.
+    Returns the AsyncOpenAI client for the given event loop, created on first use so that .env has been loaded.
+    Retries are handled by request_completion, so the client's own retries are disabled.
+    """
+    return AsyncOpenAI(max_retries=0)
+
+@functools.lru_cache(maxsize=1)
+def get_request_semaphore(loop):
+    """
+    Returns the semaphore that keeps at most MAX_CONCURRENT_REQUESTS requests in flight on the given event loop.
+    """
+    return asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute. acquire() waits until
+    both buckets can cover a request, instead of sending it and being rejected with a 429.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = requests_per_minute
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        minutes = (now - self.updated) / 60
+        self.updated = now
+        self.requests = min(self.requests_per_minute, self.requests + minutes * self.requests_per_minute)
+        self.tokens = min(self.tokens_per_minute, self.tokens + minutes * self.tokens_per_minute)
+
+    async def acquire(self, tokens):
+        # A request larger than the whole bucket waits for a full bucket rather than forever.
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self.lock:
+            self.refill()
+            while self.requests < 1 or self.tokens < tokens:
+                await asyncio.sleep(max(
+                    (1 - self.requests) * 60 / self.requests_per_minute,
+                    (tokens - self.tokens) * 60 / self.tokens_per_minute
+                ))
+                self.refill()
+            self.requests -= 1
+            self.tokens -= tokens
+
+@functools.lru_cache(maxsize=1)
+def get_rate_limiter(loop):
+    """
+    Returns the RateLimiter for the given event loop, configured from OPENAI_RPM and OPENAI_TPM once .env has been loaded.
     """
-    prompt = (
-        "Please generate a concise and informative summary for the following reading club transcription:\n\n"
-        f"{transcription}\n\nSummary:"
+    return RateLimiter(
+        rate_limit_setting("OPENAI_RPM", DEFAULT_REQUESTS_PER_MINUTE),
+        rate_limit_setting("OPENAI_TPM", DEFAULT_TOKENS_PER_MINUTE)
     )
-    print(f"{BLUE}Generating summary with OpenAI API...{RESET}")
-    client = OpenAI()
-    completion = client.chat.completions.create(
-      model="gpt-4o",
-      messages=[
-        {"role": "developer", "content": "You are a helpful assistant."},
+
+def rate_limit_setting(name, default):
+    """
+    Returns the positive whole number set in the environment variable, or the default
+    (with a warning) if it is unset or invalid.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        if int(value) > 0:
+            return int(value)
+    except ValueError:
+        pass
+    print(f"{YELLOW}Ignoring {name}={value!r}: it must be a positive whole number. Using {default}.{RESET}")
+    return default
+
+@functools.lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Returns the model's tiktoken encoding, loaded once per process.
+    """
+    return tiktoken.encoding_for_model(MODEL)
+
+@functools.lru_cache(maxsize=32)
+def count_tokens(text):
+    """
+    Returns the number of tokens the model's tokenizer produces for the text.
+    Special-token text such as <|endoftext|> is counted as ordinary text rather than rejected.
+    Counts are memoised, so a transcription used by several requests is only encoded once.
+    """
+    return len(get_encoding().encode_ordinary(text))
+
+def choose_model(tokens):
+    """
+    Returns the model to use for a request of the given size.
+    """
+    return SMALL_MODEL if tokens < SMALL_MODEL_MAX_TOKENS else MODEL
+
+def wait_for_retry(retry_state, backoff=wait_exponential(min=1, max=30)):
+    """
+    Returns how long to wait before retrying a request: what the API's Retry-After
+    header asks for (capped at a minute) if it sent one, exponential backoff otherwise.
+    """
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    if response is not None:
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return min(60, float(headers["retry-after-ms"]) / 1000)
+            if "retry-after" in headers:
+                return min(60, float(headers["retry-after"]))
+        except ValueError:
+            pass  # An HTTP date rather than seconds
+    return backoff(retry_state)
+
+@retry(
+    wait=wait_for_retry,
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    reraise=True
+)
+async def request_completion(prompt, model, tokens, output_file=None, **options):
+    """
+    Sends the prompt (tokens long, including the developer message) to the given model
+    and returns the stripped response text.
+    With an output_file, the response is streamed: tokens are echoed to the terminal and the
+    stripped response is written to a temporary file as they arrive, which replaces the
+    output_file once the stream has completed.
+    Extra options (e.g. response_format) are passed through to the API.
+    """
+    messages = [
+        {"role": "developer", "content": DEVELOPER_MESSAGE},
         {"role": "user", "content": prompt}
-      ]
+    ]
+    loop = asyncio.get_running_loop()
+    async with get_request_semaphore(loop):
+        await get_rate_limiter(loop).acquire(tokens)
+        if output_file is None:
+            completion = await get_client(loop).chat.completions.create(model=model, messages=messages, **options)
+            return completion.choices[0].message.content.strip()
+        stream = await get_client(loop).chat.completions.create(model=model, messages=messages, stream=True, **options)
+        parts = []
+        written = False
+        held = ""  # Whitespace not yet written, as it may turn out to be trailing
+        finish_reason = None
+        temporary_file = f"{output_file}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_file, "w", encoding="utf-8") as f:
+                async for chunk in stream:
+                    text = (chunk.choices[0].delta.content or "") if chunk.choices else ""
+                    finish_reason = (chunk.choices[0].finish_reason if chunk.choices else None) or finish_reason
+                    print(text, end="", flush=True)
+                    parts.append(text)
+                    # Write the stripped response as it arrives, so the file can be moved into place as is
+                    text = held + text if written else text.lstrip()
+                    body = text.rstrip()
+                    held = text[len(body):]
+                    f.write(body)
+                    written = written or bool(body)
+            if finish_reason is None:
+                # A dropped connection can end the stream without an error; retry it like one
+                raise APIConnectionError(message="Response stream ended early.", request=stream.response.request)
+        except BaseException:
+            os.remove(temporary_file)
+            if parts:
+                print(f"\n{YELLOW}Response stream interrupted; the output above is incomplete.{RESET}")
+            raise
+        print()
+    os.replace(temporary_file, output_file)
+    return "".join(parts).strip()
+
+async def chat_completion(prompt, cache_dir=None, output_file=None, parse=None, prompt_tokens=None, **options):
+    """
+    Returns the response to the prompt, reusing a previous response stored in cache_dir
+    (if given) for an identical request instead of calling the API again.
+    The response is also written to output_file (if given), streamed when it comes from the API.
+    With parse, the response is passed through it and the result is returned instead; a response
+    that parse rejects (by raising ValueError) is never cached, and an unreadable cache entry
+    is treated as a miss. The prompt is only counted when its size (prompt_tokens) is not given.
+    """
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt)
+    tokens = count_tokens(DEVELOPER_MESSAGE) + prompt_tokens
+    model = choose_model(tokens)
+    cache_file = None
+    if cache_dir:
+        request = orjson.dumps([model, PROMPT_TEMPLATE_VERSION, DEVELOPER_MESSAGE, prompt, options], option=orjson.OPT_SORT_KEYS)
+        key = hashlib.sha256(request).hexdigest()
+        cache_file = os.path.join(cache_dir, f"{key}.json")
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                response = orjson.loads(f.read())["response"]
+            if not isinstance(response, str):
+                raise ValueError("Cached response is not a string.")
+            result = parse(response) if parse else response
+        except (OSError, ValueError, KeyError, TypeError):
+            print(f"{YELLOW}Ignoring unreadable cache entry {cache_file}.{RESET}")
+        else:
+            if output_file:
+                replace_file(output_file, response.encode("utf-8"))
+                print(response)
+            return result
+    response = await request_completion(prompt, model, tokens, output_file, **options)
+    result = parse(response) if parse else response  # Validate before caching
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        replace_file(cache_file, orjson.dumps({
+            "model": model,
+            "prompt_hash": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "response": response
+        }))
+    return result
+
+async def transcribe_and_generate(audio, transcription_file, cache_dir=None):
+    """
+    Transcribes the audio in a background thread and generates the summary and the flashcards.
+    A transcription that fits FLASHCARDS_TOKEN_BUDGET is sent whole in a single request once it is done.
+    Once a longer one outgrows the budget, its finished chunks are summarized concurrently with the
+    rest of the transcription, and one final request over excerpts of the transcription and the
+    chunk summaries produces the summary and the flashcards (map-reduce).
+    Returns the transcription, the summary and the flashcards CSV.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    budget = (
+        FLASHCARDS_TOKEN_BUDGET - count_tokens(DEVELOPER_MESSAGE)
+        - count_tokens(transcription_prefix("") + summary_and_flashcards_instructions("transcription"))
+    )
+
+    def summarize_chunk(text):
+        return chat_completion(
+            f"Transcription excerpt:\n{text}\n\n"
+            "Please generate a concise and informative summary for the above excerpt of a reading club transcription.\n\n"
+            "Summary:",
+            cache_dir
+        )
+
+    async def produce():
+        try:
+            return await asyncio.to_thread(
+                transcribe_audio, audio, transcription_file,
+                lambda text: loop.call_soon_threadsafe(queue.put_nowait, text)
+            )
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    producer = asyncio.create_task(produce())
+    tokens = 0
+    pending = []  # Full batches held back until the transcription outgrows the budget
+    tasks = []
+    batch = []
+    try:
+        while (text := await queue.get()) is not None:
+            tokens += count_tokens(text)
+            batch.append(text)
+            if len(batch) == WINDOWS_PER_SUMMARY_CHUNK:
+                pending.append(" ".join(batch))
+                batch = []
+            if tokens > budget:
+                tasks += [asyncio.create_task(summarize_chunk(chunk)) for chunk in pending]
+                pending = []
+        transcription = await producer
+        if tasks:
+            if pending or batch:
+                tasks += [asyncio.create_task(summarize_chunk(chunk)) for chunk in pending + [" ".join(batch)] if chunk]
+            print(f"{BLUE}Generating summary and flashcards with OpenAI API...{RESET}")
+            partial_summaries = await asyncio.gather(*tasks)
+    except BaseException:
+        # Transcription or one of the chunk summaries failed: stop the requests still in flight.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    if not tasks:
+        # The whole transcription fits in one request; chunk summaries would only add cost.
+        summary, flashcards_csv = await generate_summary_and_flashcards(transcription, cache_dir, tokens)
+        return transcription, summary, flashcards_csv
+    section_summaries = "Summaries of consecutive parts of the transcription:\n\n" + "\n\n".join(partial_summaries) + "\n\n"
+    # The flashcards need the transcription's details, not just the summaries; send as much as fits.
+    source = "transcription excerpts and section summaries"
+    transcription_text, excerpted = fit_transcription(
+        transcription, transcription_prefix("") + section_summaries + summary_and_flashcards_instructions(source), tokens
+    )
+    if not excerpted:
+        source = "transcription and section summaries"
+    summary, flashcards_csv = await summary_and_flashcards_completion(
+        transcription_text, section_summaries, source, cache_dir, None if excerpted else tokens
+    )
+    print(f"{GREEN}Summary and flashcards generated.{RESET}")
+    return transcription, summary, flashcards_csv
+
+async def summary_and_flashcards_completion(transcription, context, source, cache_dir=None, transcription_tokens=None):
+    """
+    Requests the summary and the flashcards in a single JSON completion over the transcription
+    and the context that follows it, so the source text is only sent once.
+    Returns the summary and the flashcards CSV.
+    """
+    prompt, tokens = transcription_prompt(transcription, context + summary_and_flashcards_instructions(source), transcription_tokens)
+    return await chat_completion(
+        prompt, cache_dir, parse=parse_summary_and_flashcards, prompt_tokens=tokens, response_format={"type": "json_object"}
+    )
+
+def summary_and_flashcards_instructions(source):
+    """
+    Returns the instructions that end the summary_and_flashcards_completion prompt.
+    """
+    return (
+        f"From the above {source} of a reading club session, produce a JSON object with two string fields: "
+        "\"summary\", a concise and informative summary of the whole session, and "
+        "\"flashcards_csv\", a set of flashcards formatted as CSV with two columns: 'Front' and 'Back'. "
+        "Only output the CSV content in flashcards_csv, without any additional text."
+    )
+
+def parse_summary_and_flashcards(response):
+    """
+    Parses the JSON response of summary_and_flashcards_completion into the summary and the
+    flashcards CSV, raising ValueError if either field is missing or not a string.
+    """
+    fields = orjson.loads(response)
+    if not isinstance(fields, dict) or not all(isinstance(fields.get(name), str) for name in ("summary", "flashcards_csv")):
+        raise ValueError("Response is missing the summary or flashcards_csv field.")
+    return fields["summary"].strip(), fields["flashcards_csv"].strip()
+
+def transcription_prefix(transcription):
+    """
+    Returns the prompt prefix shared by every request made from the full transcription.
+    """
+    return f"Transcription:\n{transcription}\n\n"
+
+def transcription_prompt(transcription, rest, transcription_tokens=None):
+    """
+    Returns the prompt made of the transcription prefix followed by rest, and its size in tokens.
+    The transcription is counted on its own (unless its size is given), so it is not encoded
+    again as part of every prompt built from it.
+    """
+    if transcription_tokens is None:
+        transcription_tokens = count_tokens(transcription)
+    tokens = transcription_tokens + count_tokens(transcription_prefix("") + rest)
+    return transcription_prefix(transcription) + rest, tokens
+
+async def generate_summary(transcription, cache_dir=None, summary_file=None):
+    """
+    Uses the new OpenAI API interface to generate a summary from the transcription.
+    If summary_file is given, the summary is streamed into it as it is generated.
+    """
+    prompt, tokens = transcription_prompt(
+        transcription,
+        "Please generate a concise and informative summary for the above reading club transcription.\n\n"
+        "Summary:"
     )
-    summary = completion.choices[0].message.content.strip()
+    print(f"{BLUE}Generating summary with OpenAI API...{RESET}")
+    summary = await chat_completion(prompt, cache_dir, summary_file, prompt_tokens=tokens)
     print(f"{GREEN}Summary generated.{RESET}")
     return summary
 
-def generate_flashcards(summary, transcription):
+def downsample_transcription(transcription, budget, tokens=None):
+    """
+    Cuts the transcription down to at most budget tokens by keeping its first and last paragraphs
+    (or sentences, or runs of words if it is unpunctuated) and evenly spaced ones in between.
+    Omitted stretches are marked with [...], and the markers count towards the budget.
+    The transcription's size is counted unless given as tokens.
+    """
+    pieces = [piece for piece in re.split(r"\n\s*\n", transcription) if piece.strip()]
+    separator = "\n\n"
+    if len(pieces) <= 1:
+        pieces = re.split(r"(?<=[.!?])\s+", transcription.strip())
+        separator = " "
+    if len(pieces) <= 1:
+        pieces = re.findall(rf"\S+(?:\s+\S+){{0,{DOWNSAMPLE_WORDS_PER_PIECE - 1}}}", transcription)
+
+    def join(indices):
+        excerpts = []
+        previous = -1
+        for index in indices:
+            if index != previous + 1:
+                excerpts.append("[...]")
+            excerpts.append(pieces[index])
+            previous = index
+        if previous != len(pieces) - 1:
+            excerpts.append("[...]")
+        return separator.join(excerpts)
+
+    total = max(1, count_tokens(transcription) if tokens is None else tokens)
+    keep = min(len(pieces), max(2, budget * len(pieces) // total))
+    while True:
+        if keep >= len(pieces):
+            indices = list(range(len(pieces)))
+        elif keep <= 1:
+            indices = [0]
+        else:
+            indices = sorted({round(i * (len(pieces) - 1) / (keep - 1)) for i in range(keep)})
+        excerpt = join(indices)
+        tokens = count_tokens(excerpt)
+        if keep <= 1 or tokens <= budget:
+            break
+        keep -= 1
+    # A single piece can still be too long (e.g. one huge word); cut it by characters.
+    while tokens > budget and excerpt:
+        excerpt = excerpt[:min(len(excerpt) - 1, len(excerpt) * budget // tokens)]
+        tokens = count_tokens(excerpt)
+    return excerpt
+
+def fit_transcription(transcription, context, tokens=None):
+    """
+    Returns the transcription, or excerpts of it if the prompt would exceed FLASHCARDS_TOKEN_BUDGET,
+    together with whether it was cut down. The context is the rest of the prompt (headers, summary
+    and instructions); it and the developer message count towards the budget. The transcription's
+    size is counted unless given as tokens.
+    """
+    if tokens is None:
+        tokens = count_tokens(transcription)
+    budget = max(0, FLASHCARDS_TOKEN_BUDGET - count_tokens(DEVELOPER_MESSAGE) - count_tokens(context))
+    if tokens <= budget:
+        return transcription, False
+    print(f"{YELLOW}Transcription is too long; sending excerpts of it alongside the summary.{RESET}")
+    return downsample_transcription(transcription, budget, tokens), True
+
+async def generate_flashcards(transcription, summary=None, cache_dir=None, flashcards_file=None):
     """
     Uses the new OpenAI API interface to generate flashcards in CSV format.
+    The summary is included in the prompt when one is available; if the summary and the
+    transcription together exceed FLASHCARDS_TOKEN_BUDGET, only excerpts of the transcription are sent.
+    If flashcards_file is given, the CSV is streamed into it as it is generated.
     """
-    prompt = (
-        "Using the following summary and transcription from a reading club session, create a set of flashcards. "
-        "Format the output as a CSV file with two columns: 'Front' and 'Back'. Only output the CSV content without any additional text.\n\n"
-        f"Summary:\n{summary}\n\n"
-        f"Transcription:\n{transcription}\n\n"
-        "CSV:"
-    )
+    def instructions(source):
+        return (
+            f"Using the above {source} from a reading club session, create a set of flashcards. "
+            "Format the output as a CSV file with two columns: 'Front' and 'Back'. Only output the CSV content without any additional text.\n\n"
+            "CSV:"
+        )
+
+    if summary is None:
+        prompt, tokens = transcription_prompt(transcription, instructions("transcription"))
+    else:
+        summary_section = f"Summary:\n{summary}\n\n"
+        source = "summary and transcription excerpts"
+        transcription, excerpted = fit_transcription(
+            transcription, transcription_prefix("") + summary_section + instructions(source)
+        )
+        if not excerpted:
+            source = "summary and transcription"
+        prompt, tokens = transcription_prompt(transcription, summary_section + instructions(source))
     print(f"{BLUE}Generating flashcards with OpenAI API...{RESET}")
-    client = OpenAI()
-    completion = client.chat.completions.create(
-      model="gpt-4o",
-      messages=[
-        {"role": "developer", "content": "You are a helpful assistant."},
-        {"role": "user", "content": prompt}
-      ]
-    )
-    flashcards_csv = completion.choices[0].message.content.strip()
+    flashcards_csv = await chat_completion(prompt, cache_dir, flashcards_file, prompt_tokens=tokens)
     print(f"{GREEN}Flashcards generated.{RESET}")
     return flashcards_csv
 
+async def generate_summary_and_flashcards(transcription, cache_dir=None, transcription_tokens=None):
+    """
+    Generates the summary and the flashcards from the transcription with a single request.
+    The transcription's size in tokens is counted unless given.
+    """
+    print(f"{BLUE}Generating summary and flashcards with OpenAI API...{RESET}")
+    summary, flashcards_csv = await summary_and_flashcards_completion(
+        transcription, "", "transcription", cache_dir, transcription_tokens
+    )
+    print(f"{GREEN}Summary and flashcards generated.{RESET}")
+    return summary, flashcards_csv
+
 def interactive_menu():
     print_header()
 
-    print("Select the operation you would like to perform:")
-    print("  1. Full workflow (extract audio, transcribe, generate summary, and flashcards)")
-    print("  2. Extract audio only")
-    print("  3. Transcribe audio only (and save transcription)")
-    print("  4. Generate summary (from existing transcription file)")
-    print("  5. Generate flashcards (requires transcription; summary will be generated if missing)")
-    print("  6. Generate summary and flashcards (from existing transcription file)")
-    print("  7. Quit")
+    options = [
+        "Select the operation you would like to perform:",
+        "  1. Full workflow (extract audio, transcribe, generate summary, and flashcards)",
+        "  2. Extract audio only (select one or more videos)",
+        "  3. Transcribe audio only (and save transcription)",
+        "  4. Generate summary (from existing transcription file)",
+        "  5. Generate flashcards (requires transcription; summary will be generated if missing)",
+        "  6. Generate summary and flashcards (from existing transcription file)",
+        "  7. Quit"
+    ]
+    sys.stdout.write("\n".join(options) + "\n")
 
     choice = input(f"\nEnter your choice (1-7): ").strip()
 
@@ -169,38 +930,38 @@ def interactive_menu():
     summary_file = os.path.join(output_folder, "summary.txt")
     flashcards_file = os.path.join(output_folder, "flashcards.csv")
     audio_file = os.path.join(output_folder, "audio.wav")
+    cache_dir = os.path.join(output_folder, ".cache")
 
     if choice == "1":
         video_file = choose_video_file()
         if not video_file:
             return
-        extract_audio(video_file, audio_file)
-        transcription = transcribe_audio(audio_file, transcription_file)
-        summary = generate_summary(transcription)
-        with open(summary_file, "w", encoding="utf-8") as f:
-            f.write(summary)
-        flashcards_csv = generate_flashcards(summary, transcription)
-        with open(flashcards_file, "w", encoding="utf-8") as f:
-            f.write(flashcards_csv)
+        audio = asyncio.run(extract_audio_and_load_model(video_file))
+        transcription, summary, flashcards_csv = asyncio.run(transcribe_and_generate(audio, transcription_file, cache_dir))
+        write_text_file(summary_file, summary)
+        write_text_file(flashcards_file, flashcards_csv)
         print(f"{GREEN}Full workflow complete!{RESET}")
-        print(f"{GREEN}Audio saved to {audio_file}{RESET}")
         print(f"{GREEN}Transcription saved to {transcription_file}{RESET}")
         print(f"{GREEN}Summary saved to {summary_file}{RESET}")
         print(f"{GREEN}Flashcards saved to {flashcards_file}{RESET}")
 
     elif choice == "2":
-        video_file = choose_video_file()
-        if not video_file:
+        video_files = choose_video_file(multiple=True)
+        if not video_files:
             return
-        extract_audio(video_file, audio_file)
-        print(f"{GREEN}Audio extraction complete. File saved to {audio_file}{RESET}")
+        if len(video_files) == 1:
+            audio_files = [audio_file]
+        else:
+            audio_files = batch_audio_files(video_files, output_folder)
+        asyncio.run(extract_audio_batch(video_files, audio_files))
+        print(f"{GREEN}Audio extraction complete. Files saved to {', '.join(audio_files)}{RESET}")
 
     elif choice == "3":
         video_file = choose_video_file()
         if not video_file:
             return
-        extract_audio(video_file, audio_file)
-        transcription = transcribe_audio(audio_file, transcription_file)
+        audio = asyncio.run(extract_audio_and_load_model(video_file))
+        transcription = transcribe_audio(audio, transcription_file)
         print(f"{GREEN}Transcription complete. File saved to {transcription_file}{RESET}")
 
     elif choice == "4":
@@ -209,9 +970,7 @@ def interactive_menu():
             return
         with open(transcription_file, "r", encoding="utf-8") as f:
             transcription = f.read()
-        summary = generate_summary(transcription)
-        with open(summary_file, "w", encoding="utf-8") as f:
-            f.write(summary)
+        asyncio.run(generate_summary(transcription, cache_dir, summary_file))
         print(f"{GREEN}Summary generated and saved to {summary_file}{RESET}")
 
     elif choice == "5":
@@ -223,13 +982,11 @@ def interactive_menu():
         if os.path.exists(summary_file):
             with open(summary_file, "r", encoding="utf-8") as f:
                 summary = f.read()
+            asyncio.run(generate_flashcards(transcription, summary, cache_dir, flashcards_file))
         else:
-            summary = generate_summary(transcription)
-            with open(summary_file, "w", encoding="utf-8") as f:
-                f.write(summary)
-        flashcards_csv = generate_flashcards(summary, transcription)
-        with open(flashcards_file, "w", encoding="utf-8") as f:
-            f.write(flashcards_csv)
+            summary, flashcards_csv = asyncio.run(generate_summary_and_flashcards(transcription, cache_dir))
+            write_text_file(summary_file, summary)
+            write_text_file(flashcards_file, flashcards_csv)
         print(f"{GREEN}Flashcards generated and saved to {flashcards_file}{RESET}")
 
     elif choice == "6":
@@ -238,12 +995,9 @@ def interactive_menu():
             return
         with open(transcription_file, "r", encoding="utf-8") as f:
             transcription = f.read()
-        summary = generate_summary(transcription)
-        with open(summary_file, "w", encoding="utf-8") as f:
-            f.write(summary)
-        flashcards_csv = generate_flashcards(summary, transcription)
-        with open(flashcards_file, "w", encoding="utf-8") as f:
-            f.write(flashcards_csv)
+        summary, flashcards_csv = asyncio.run(generate_summary_and_flashcards(transcription, cache_dir))
+        write_text_file(summary_file, summary)
+        write_text_file(flashcards_file, flashcards_csv)
         print(f"{GREEN}Summary and flashcards generated and saved to {summary_file} and {flashcards_file}{RESET}")
 
     elif choice == "7":
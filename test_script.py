@@ -0,0 +1,334 @@
+import asyncio
+import os
+import types
+
+import httpx
+import openai
+import pytest
+
+import script
+
+
+def test_find_split_points_cuts_in_the_middle_of_the_nearest_pause():
+    speech_chunks = [
+        {"start": 0, "end": 100},
+        {"start": 120, "end": 290},
+        {"start": 310, "end": 600},
+        {"start": 640, "end": 1000},
+    ]
+    assert script.find_split_points(1000, speech_chunks, 300) == [300, 620]
+
+
+def test_find_split_points_without_pauses_keeps_one_part():
+    assert script.find_split_points(1000, [{"start": 0, "end": 1000}], 300) == []
+    assert script.find_split_points(1000, [], 300) == []
+
+
+def fake_completions(monkeypatch, responses):
+    """
+    Replaces the API call with one that returns the given responses in order
+    and counts tokens without tiktoken.
+    """
+    calls = []
+
+    async def request_completion(prompt, model, tokens, output_file=None, **options):
+        calls.append(prompt)
+        return responses[len(calls) - 1]
+
+    monkeypatch.setattr(script, "request_completion", request_completion)
+    monkeypatch.setattr(script, "count_tokens", lambda text: len(text) // 4)
+    return calls
+
+
+def test_chat_completion_does_not_cache_a_response_that_fails_to_parse(monkeypatch, tmp_path):
+    good = '{"summary": " S ", "flashcards_csv": "Front,Back"}'
+    calls = fake_completions(monkeypatch, ["not json", good, "unused"])
+    prompt = "prompt"
+    with pytest.raises(ValueError):
+        asyncio.run(script.chat_completion(prompt, str(tmp_path), parse=script.parse_summary_and_flashcards))
+    assert list(tmp_path.iterdir()) == []
+    for _ in range(2):
+        result = asyncio.run(script.chat_completion(prompt, str(tmp_path), parse=script.parse_summary_and_flashcards))
+        assert result == ("S", "Front,Back")
+    assert len(calls) == 2
+
+
+def test_chat_completion_treats_a_corrupt_cache_entry_as_a_miss(monkeypatch, tmp_path):
+    calls = fake_completions(monkeypatch, ["first", "second"])
+    assert asyncio.run(script.chat_completion("prompt", str(tmp_path))) == "first"
+    (cache_file,) = tmp_path.iterdir()
+    cache_file.write_bytes(b"{truncated")
+    assert asyncio.run(script.chat_completion("prompt", str(tmp_path))) == "second"
+    assert asyncio.run(script.chat_completion("prompt", str(tmp_path))) == "second"
+    assert len(calls) == 2
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_downsample_transcription_counts_markers_against_the_budget(monkeypatch):
+    monkeypatch.setattr(script, "count_tokens", count_words)
+    transcription = "\n\n".join(f"Paragraph {i}." for i in range(1000))
+    excerpt = script.downsample_transcription(transcription, 200)
+    assert "[...]" in excerpt
+    assert excerpt.startswith("Paragraph 0.") and "Paragraph 999." in excerpt
+    assert count_words(excerpt) <= 200
+
+
+def test_downsample_transcription_excerpts_unpunctuated_text(monkeypatch):
+    monkeypatch.setattr(script, "count_tokens", count_words)
+    transcription = " ".join(f"word{i}" for i in range(5000))
+    excerpt = script.downsample_transcription(transcription, 300)
+    assert "[...]" in excerpt
+    assert excerpt.startswith("word0 ") and excerpt.endswith(" word4999")
+    assert 200 < count_words(excerpt) <= 300
+
+
+def test_generate_flashcards_keeps_the_whole_prompt_within_the_budget(monkeypatch):
+    calls = fake_completions(monkeypatch, ["Front,Back"])
+    monkeypatch.setattr(script, "count_tokens", count_words)
+    monkeypatch.setattr(script, "FLASHCARDS_TOKEN_BUDGET", 500)
+    transcription = " ".join(f"Sentence number {i}." for i in range(1000))
+    summary = " ".join(["summary"] * 100)
+    asyncio.run(script.generate_flashcards(transcription, summary))
+    (prompt,) = calls
+    assert "[...]" in prompt and "transcription excerpts" in prompt
+    assert count_words(script.DEVELOPER_MESSAGE) + count_words(prompt) <= 500
+
+
+def test_batch_audio_files_gives_videos_with_the_same_name_distinct_outputs():
+    video_files = ["in/talk.mp4", "other/talk.mov", "in/Talk.mp4", "in/notes.avi"]
+    assert script.batch_audio_files(video_files, "out") == [
+        os.path.join("out", "talk.wav"),
+        os.path.join("out", "talk_mov.wav"),
+        os.path.join("out", "Talk_mp4.wav"),
+        os.path.join("out", "notes.wav"),
+    ]
+
+
+def retry_state(error, attempt_number=1):
+    return types.SimpleNamespace(
+        outcome=types.SimpleNamespace(exception=lambda: error), attempt_number=attempt_number
+    )
+
+
+def rate_limit_error(headers):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_wait_for_retry_honours_retry_after():
+    assert script.wait_for_retry(retry_state(rate_limit_error({"retry-after": "7"}))) == 7
+    assert script.wait_for_retry(retry_state(rate_limit_error({"retry-after-ms": "1500"}))) == 1.5
+    assert script.wait_for_retry(retry_state(rate_limit_error({"retry-after": "3600"}))) == 60
+
+
+def test_wait_for_retry_backs_off_without_retry_after():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    assert script.wait_for_retry(retry_state(rate_limit_error({}), attempt_number=3)) == 4
+    assert script.wait_for_retry(retry_state(openai.APIConnectionError(request=request), attempt_number=1)) == 1
+
+
+def test_transcribe_and_generate_cancels_chunk_summaries_when_transcription_fails(monkeypatch):
+    cancelled = []
+
+    async def request_completion(prompt, model, tokens, output_file=None, **options):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+
+    def transcribe_audio(audio, transcription_file, on_chunk=None):
+        for index in range(2 * script.WINDOWS_PER_SUMMARY_CHUNK):
+            on_chunk(" ".join(["word"] * 2000))
+        raise RuntimeError("decoding failed")
+
+    monkeypatch.setattr(script, "request_completion", request_completion)
+    monkeypatch.setattr(script, "transcribe_audio", transcribe_audio)
+    monkeypatch.setattr(script, "count_tokens", count_words)
+
+    async def main():
+        with pytest.raises(RuntimeError, match="decoding failed"):
+            await script.transcribe_and_generate(None, "unused.txt")
+        # Checked before asyncio.run() cancels whatever is left on the loop.
+        assert len(cancelled) == 2
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("value", ["0", "-5", "fast", "1.5", ""])
+def test_rate_limit_setting_falls_back_to_the_default_for_invalid_values(monkeypatch, value):
+    monkeypatch.setenv("OPENAI_RPM", value)
+    assert script.rate_limit_setting("OPENAI_RPM", 500) == 500
+
+
+def test_rate_limit_setting_reads_positive_numbers(monkeypatch):
+    monkeypatch.setenv("OPENAI_RPM", " 60 ")
+    assert script.rate_limit_setting("OPENAI_RPM", 500) == 60
+    monkeypatch.delenv("OPENAI_RPM")
+    assert script.rate_limit_setting("OPENAI_RPM", 500) == 500
+
+
+def test_transcribe_audio_logs_progress_in_tenths_when_not_a_terminal(monkeypatch, tmp_path, capsys):
+    def decode_segments(audio, infos):
+        return ((float(end), f"Word {end}.") for end in range(1, 601))
+
+    monkeypatch.setattr(script, "decode_segments", decode_segments)
+    audio = script.np.zeros(600 * script.SAMPLE_RATE, script.np.float32)
+    transcription = script.transcribe_audio(audio, str(tmp_path / "transcription.txt"))
+    output = capsys.readouterr().out
+    assert "\r" not in output
+    assert output.count("Transcribed ") == 10
+    assert transcription.startswith("Word 1. Word 2.")
+
+
+class FakeWhisperModel:
+    """
+    Stands in for WhisperModel: every part yields one segment per second of audio.
+    """
+
+    feature_extractor = types.SimpleNamespace(n_samples=30 * script.SAMPLE_RATE)
+
+    def __init__(self):
+        self.detected = []
+        self.languages = []
+
+    def detect_language(self, audio, **options):
+        self.detected.append((len(audio), options))
+        return "en", 1.0, [("en", 1.0)]
+
+    def transcribe(self, audio, language=None, **options):
+        self.languages.append(language)
+        seconds = len(audio) // script.SAMPLE_RATE
+        segments = (types.SimpleNamespace(end=float(second), text=f" s{second}") for second in range(1, seconds + 1))
+        return segments, types.SimpleNamespace(duration=seconds, duration_after_vad=seconds)
+
+
+def test_decode_segments_transcribes_long_cpu_recordings_in_parallel_parts(monkeypatch):
+    model = FakeWhisperModel()
+    rate = script.SAMPLE_RATE
+    speech_chunks = [{"start": 0, "end": 290 * rate}, {"start": 310 * rate, "end": 700 * rate}]
+    monkeypatch.setattr(script, "get_device", lambda: ("cpu", "int8"))
+    monkeypatch.setattr(script, "TRANSCRIPTION_WORKERS", 2)
+    monkeypatch.setattr(script, "get_whisper_model", lambda name, workers=1: model)
+    monkeypatch.setattr(script, "get_speech_timestamps", lambda audio, options: speech_chunks)
+    audio = script.np.zeros(700 * rate, script.np.float32)
+    infos = []
+    segments = list(script.decode_segments(audio, infos))
+    # Split once, in the middle of the pause at 290-310 s
+    assert [info.duration for info in infos] == [300, 400]
+    assert segments[299] == (300.0, "s300") and segments[300] == (301.0, "s1")
+    assert segments[-1] == (700.0, "s400")
+    # The language is detected once, from the first 30 s of speech, without another VAD pass
+    assert model.detected == [(30 * rate, {})]
+    assert model.languages == ["en", "en"]
+
+
+@pytest.mark.parametrize("probed, workers", [(b"900.5\n", 4), (b"120.0\n", 1), (b"N/A\n", 1)])
+def test_load_model_for_preloads_the_model_transcription_will_use(monkeypatch, probed, workers):
+    loaded = []
+
+    async def run_ffmpeg(command, capture_output=False):
+        return probed
+
+    monkeypatch.setattr(script, "run_ffmpeg", run_ffmpeg)
+    monkeypatch.setattr(script, "get_device", lambda: ("cpu", "int8"))
+    monkeypatch.setattr(script, "TRANSCRIPTION_WORKERS", 4)
+    monkeypatch.setattr(script, "get_whisper_model", lambda name, workers=1: loaded.append(workers))
+    asyncio.run(script.load_model_for("talk.mp4"))
+    assert loaded == [workers]
+
+
+def fake_workflow(monkeypatch, windows):
+    """
+    Runs transcribe_and_generate over the given transcription windows with fake requests,
+    and returns the prompts that were sent.
+    """
+    prompts = []
+
+    async def request_completion(prompt, model, tokens, output_file=None, **options):
+        prompts.append(prompt)
+        if options.get("response_format"):
+            return '{"summary": "S", "flashcards_csv": "Front,Back"}'
+        return f"Section summary {len(prompts)}."
+
+    def transcribe_audio(audio, transcription_file, on_chunk=None):
+        for window in windows:
+            on_chunk(window)
+        return " ".join(windows)
+
+    monkeypatch.setattr(script, "request_completion", request_completion)
+    monkeypatch.setattr(script, "transcribe_audio", transcribe_audio)
+    monkeypatch.setattr(script, "count_tokens", count_words)
+    assert asyncio.run(script.transcribe_and_generate(None, "unused.txt"))[1:] == ("S", "Front,Back")
+    return prompts
+
+
+def test_transcribe_and_generate_sends_a_transcription_that_fits_in_one_request(monkeypatch):
+    prompts = fake_workflow(monkeypatch, [f"Window {index}." for index in range(25)])
+    assert len(prompts) == 1
+    assert "Summaries of consecutive parts" not in prompts[0]
+
+
+def test_transcribe_and_generate_summarizes_chunks_of_long_transcriptions(monkeypatch):
+    windows = [f"Window {index}. " + " ".join(["word"] * 2000) for index in range(25)]
+    prompts = fake_workflow(monkeypatch, windows)
+    # Three chunk summaries (10 + 10 + 5 windows), then one request over excerpts and the summaries
+    assert len(prompts) == 4
+    assert "Summaries of consecutive parts" in prompts[-1] and "[...]" in prompts[-1]
+    assert count_words(script.DEVELOPER_MESSAGE) + count_words(prompts[-1]) <= script.FLASHCARDS_TOKEN_BUDGET
+
+
+def test_request_completion_streams_the_stripped_response_into_the_output_file(monkeypatch, tmp_path):
+    deltas = ["\n ", " Hello", " world", " \n", None, "!\n\n"]
+
+    async def stream():
+        for index, delta in enumerate(deltas):
+            finish_reason = "stop" if index == len(deltas) - 1 else None
+            choice = types.SimpleNamespace(delta=types.SimpleNamespace(content=delta), finish_reason=finish_reason)
+            yield types.SimpleNamespace(choices=[choice])
+
+    async def create(**options):
+        assert options["stream"]
+        return stream()
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(script, "get_client", lambda loop: client)
+    output_file = tmp_path / "summary.txt"
+    response = asyncio.run(script.request_completion("prompt", "model", 10, str(output_file)))
+    assert response == "Hello world \n!"
+    assert output_file.read_text(encoding="utf-8") == response
+    assert [path.name for path in tmp_path.iterdir()] == ["summary.txt"]
+
+
+def test_count_tokens_accepts_special_token_text(monkeypatch):
+    encoding = types.SimpleNamespace(
+        encode=lambda text: pytest.fail("encode() rejects special-token text"),
+        encode_ordinary=lambda text: text.split(),
+    )
+    monkeypatch.setattr(script, "get_encoding", lambda: encoding)
+    assert script.count_tokens("before <|endoftext|> after") == 3
+
+
+def test_the_transcription_is_only_encoded_once(monkeypatch):
+    encoded = []
+
+    def encode_ordinary(text):
+        encoded.append(text)
+        return text.split()
+
+    async def request_completion(prompt, model, tokens, output_file=None, **options):
+        return "Response."
+
+    monkeypatch.setattr(script, "get_encoding", lambda: types.SimpleNamespace(encode_ordinary=encode_ordinary))
+    monkeypatch.setattr(script, "request_completion", request_completion)
+    monkeypatch.setattr(script, "FLASHCARDS_TOKEN_BUDGET", 500)
+    script.count_tokens.cache_clear()
+    transcription = " ".join(f"Sentence number {i}." for i in range(1000))
+    summary = asyncio.run(script.generate_summary(transcription))
+    asyncio.run(script.generate_flashcards(transcription, summary))
+    script.count_tokens.cache_clear()
+    assert sum(transcription in text for text in encoded) == 1